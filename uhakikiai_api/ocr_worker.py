@@ -0,0 +1,263 @@
+"""
+Dedicated OCR worker processes.
+
+Each worker loads the OCR model once and serves jobs sent over its own pipe,
+so the model lives in OCR_WORKERS processes instead of every pipeline process.
+The API process talks to them through OCRWorkerPool.submit().
+"""
+import os
+import threading
+import collections
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image
+
+try:
+    from tesserocr import PyTessBaseAPI, PSM  # In-process Tesseract (no subprocess per call)
+except ImportError:
+    PyTessBaseAPI = None
+
+OCR_ONNX_DET_MODEL = os.environ.get("OCR_ONNX_DET_MODEL", "models/ppocrv5_mobile_det.onnx")
+OCR_ONNX_REC_MODEL = os.environ.get("OCR_ONNX_REC_MODEL", "models/ppocrv5_mobile_rec.onnx")
+OCR_ONNX_DICT = os.environ.get("OCR_ONNX_DICT", "models/ppocrv5_dict.txt")
+
+
+# --- BACKENDS (run inside the worker) ---
+
+def run_ocr_extraction(img_gray, api=None):
+    """
+    Step 2: Extract Text Data (UPDATED to Tesseract)
+    Uses the worker's tesserocr handle when available, pytesseract otherwise.
+    """
+    # Preprocessing to help Tesseract (Otsu picks the threshold per page, so dark/light scans binarize cleanly)
+    _, thresh = cv2.threshold(img_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    try:
+        # Extract text
+        if api is not None:
+            api.SetImage(Image.fromarray(thresh))
+            full_text = api.GetUTF8Text().upper()
+        else:
+            full_text = pytesseract.image_to_string(thresh).upper()
+        return full_text, []
+    except Exception as e:
+        print(f"OCR Error: {e}")
+        # None marks a failed read (vs. a blank page) so the API doesn't cache it
+        return None, []
+
+
+def load_tesseract_backend():
+    print("Loading OCR Engine (Tesseract)...")
+    api = None
+    if PyTessBaseAPI is not None:
+        try:
+            api = PyTessBaseAPI(lang='eng', psm=PSM.AUTO)
+        except Exception as e:
+            print(f"Warning: tesserocr failed to initialize, using pytesseract. {e}")
+
+    if api is None:
+        try:
+            # Verify tesseract is installed
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            print(f"Warning: OCR Engine failed to load. {e}")
+
+    def read_batch(images):
+        return [run_ocr_extraction(img, api)[0] for img in images]
+
+    print("OCR Model Loaded.")
+    return read_batch
+
+
+def load_batched_backend(backend, threads):
+    """
+    Loads and warms up a batched OCR backend ("easyocr" or "onnx").
+    Returns a read_batch(images) -> [UPPERCASE_TEXT] callable.
+    """
+    if backend == "onnx":
+        from ppocr_onnx import PPOCREngine  # Optional dependency (onnxruntime)
+        print("Loading OCR Engine (PP-OCRv5, ONNX Runtime)...")
+        engine = PPOCREngine(OCR_ONNX_DET_MODEL, OCR_ONNX_REC_MODEL, OCR_ONNX_DICT, threads=threads)
+        engine.warmup()
+
+        def read_batch(images):
+            return [text.upper() for text in engine.read_batch(images)]
+    else:
+        import easyocr  # Optional heavy dependency (torch)
+        print("Loading OCR Engine (EasyOCR, batched)...")
+        reader = easyocr.Reader(['en'], cudnn_benchmark=True)
+        width, height = 800, 600
+        # First batched call pays cuDNN autotuning / allocator setup; do it before serving traffic
+        reader.readtext_batched(np.zeros([16, height, width, 3], dtype=np.uint8), n_width=width, n_height=height, detail=0)
+
+        def read_batch(images):
+            results = reader.readtext_batched(images, n_width=width, n_height=height, detail=0)
+            return [" ".join(words).upper() for words in results]
+
+    print("OCR Model Loaded.")
+    return read_batch
+
+
+def load_ocr_backend(backend, threads):
+    """
+    Returns (loaded_backend, read_batch). Batched backends fall back to Tesseract if they fail to load.
+    """
+    if backend in ("easyocr", "onnx"):
+        try:
+            return backend, load_batched_backend(backend, threads)
+        except Exception as e:
+            print(f"Warning: {backend} OCR failed to load, falling back to Tesseract. {e}")
+    return "tesseract", load_tesseract_backend()
+
+
+def worker_main(backend, threads, conn):
+    loaded_backend, read_batch = load_ocr_backend(backend, threads)
+    # First message = readiness handshake
+    conn.send(loaded_backend)
+
+    while True:
+        try:
+            images = conn.recv()
+        except EOFError:
+            break
+        if images is None:
+            break
+        try:
+            conn.send((read_batch(images), None))
+        except Exception as e:
+            conn.send((None, str(e)))
+
+
+# --- CLIENT (runs in the API process) ---
+
+class OCRWorker:
+    """
+    One OCR process and its pipe. `future` is the job it is running (None when idle).
+    """
+    def __init__(self, ctx, backend, threads):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(backend, threads, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.loaded = False
+        self.future = None
+
+
+class OCRWorkerPool:
+    """
+    Starts `size` OCR worker processes, each with its own pipe (a worker that dies can't
+    wedge a lock shared with the others). submit(images) returns a concurrent.futures.Future
+    with one text per image; a dispatcher thread hands queued jobs to idle workers, routes
+    replies back, and restarts any worker that exits (failing the job it was running).
+    """
+    def __init__(self, backend, size):
+        # spawn: workers start clean instead of inheriting the API process (DB clients, threads)
+        self.ctx = mp.get_context("spawn")
+        self.backend = backend
+        self.threads = max(1, (os.cpu_count() or 1) // size)
+        self.backlog = collections.deque()
+        self.lock = threading.Lock()
+        self.closing = False
+        # submit() pokes the dispatcher through this pipe so only the dispatcher writes to workers
+        self.wake_reader, self.wake_writer = self.ctx.Pipe(duplex=False)
+
+        # Resolves to the backend the workers actually loaded once all of them are up
+        self.ready = Future()
+        self._ready_count = 0
+
+        self.workers = [OCRWorker(self.ctx, backend, self.threads) for _ in range(size)]
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, images) -> Future:
+        future = Future()
+        with self.lock:
+            self.backlog.append((future, images))
+            self.wake_writer.send_bytes(b"")
+        return future
+
+    def _restart(self, index):
+        worker = self.workers[index]
+        print(f"Warning: OCR worker {index} exited (code {worker.process.exitcode}), restarting.")
+        if worker.future is not None:
+            worker.future.set_exception(RuntimeError(f"OCR worker {index} crashed"))
+        worker.conn.close()
+        self.workers[index] = OCRWorker(self.ctx, self.backend, self.threads)
+
+    def _handle_reply(self, worker, reply):
+        if not worker.loaded:
+            worker.loaded = True
+            self._ready_count += 1
+            if self._ready_count == len(self.workers) and not self.ready.done():
+                self.ready.set_result(reply)
+            return
+        result, error = reply
+        future, worker.future = worker.future, None
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(result)
+
+    def _assign(self):
+        for index, worker in enumerate(self.workers):
+            if not worker.loaded or worker.future is not None:
+                continue
+            with self.lock:
+                # Skip jobs whose caller already gave up (timed out / cancelled)
+                while self.backlog and not self.backlog[0][0].set_running_or_notify_cancel():
+                    self.backlog.popleft()
+                if not self.backlog:
+                    return
+                future, images = self.backlog.popleft()
+            worker.future = future
+            try:
+                worker.conn.send(images)
+            except OSError:
+                self._restart(index)
+
+    def _dispatch(self):
+        while not self.closing:
+            waitables = [self.wake_reader]
+            for worker in self.workers:
+                waitables += [worker.conn, worker.process.sentinel]
+            wait(waitables)
+
+            while self.wake_reader.poll():
+                self.wake_reader.recv_bytes()
+
+            for index, worker in enumerate(self.workers):
+                # One bad reply or dead worker must not stop routing for everyone else
+                try:
+                    if worker.conn.poll():
+                        self._handle_reply(worker, worker.conn.recv())
+                    elif not worker.process.is_alive() and not self.closing:
+                        self._restart(index)
+                except (EOFError, OSError):
+                    if not self.closing:
+                        self._restart(index)
+                except Exception as e:
+                    print(f"OCR dispatcher error: {e}")
+
+            self._assign()
+
+    def close(self):
+        self.closing = True
+        with self.lock:
+            self.wake_writer.send_bytes(b"")
+        self.dispatcher.join(timeout=5)
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+        with self.lock:
+            for future, _ in self.backlog:
+                future.cancel()
+            self.backlog.clear()
@@ -0,0 +1,170 @@
+"""
+PP-OCRv5 mobile (det + rec) on ONNX Runtime.
+
+Pipeline: DB text detection -> rotated line crops -> CTC recognition.
+Models are exported from PaddleOCR with paddle2onnx; paths come from the OCR_ONNX_* env vars.
+The rec model can be swapped for an int8 copy made with quantize_ocr.py.
+"""
+import os
+import math
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+# Detection (DB) settings, PaddleOCR defaults
+DET_LIMIT_SIDE = 960
+DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+DET_THRESH = 0.3
+DET_BOX_THRESH = 0.6
+DET_UNCLIP_RATIO = 1.5
+DET_MIN_SIZE = 3
+DET_MAX_BOXES = 1000
+
+# Recognition (CTC) settings
+REC_HEIGHT = 48
+REC_MAX_WIDTH = 1280
+REC_BATCH = 16
+
+
+def create_session(model_path, threads=None):
+    """
+    One CPU session per model, using every core (or `threads`) for intra-op parallelism.
+    """
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = threads or os.cpu_count()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Keep intra-op threads spinning between the back-to-back det/rec runs of a batch
+    so.add_session_config_entry("session.intra_op.allow_spinning", "1")
+    return ort.InferenceSession(model_path, sess_options=so, providers=["CPUExecutionProvider"])
+
+
+def _order_points(pts):
+    # top-left, top-right, bottom-right, bottom-left
+    s = pts.sum(axis=1)
+    d = np.diff(pts, axis=1).ravel()
+    return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]], dtype=np.float32)
+
+
+def _crop_box(img, box):
+    width = int(max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3])))
+    height = int(max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2])))
+    if width < 1 or height < 1:
+        return None
+    dst = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(box, dst)
+    crop = cv2.warpPerspective(img, matrix, (width, height), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    # Vertical text lines are read rotated
+    if height / width >= 1.5:
+        crop = np.ascontiguousarray(np.rot90(crop))
+    return crop
+
+
+def _sort_reading_order(boxes):
+    # Top-to-bottom, then left-to-right within a line (same pass PaddleOCR uses)
+    boxes.sort(key=lambda b: (b[0][1], b[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+class PPOCREngine:
+    """
+    Loads the det/rec sessions once and serves batched reads.
+    Sessions are thread-safe, so one engine is shared across requests.
+    """
+    def __init__(self, det_model_path, rec_model_path, dict_path, threads=None):
+        self.det = create_session(det_model_path, threads)
+        self.rec = create_session(rec_model_path, threads)
+        self.det_input = self.det.get_inputs()[0].name
+        self.rec_input = self.rec.get_inputs()[0].name
+
+        with open(dict_path, encoding="utf-8") as f:
+            chars = [line.rstrip("\r\n") for line in f]
+        # Index 0 is the CTC blank; PP-OCR dictionaries append the space character
+        self.charset = ["blank"] + chars + [" "]
+
+    def warmup(self):
+        self.read_batch([np.zeros((600, 800, 3), dtype=np.uint8)])
+        self._recognize([np.zeros((REC_HEIGHT, 320, 3), dtype=np.uint8)])
+
+    def _detect(self, img):
+        h, w = img.shape[:2]
+        ratio = min(1.0, DET_LIMIT_SIDE / max(h, w))
+        resized_h = max(32, int(round(h * ratio / 32)) * 32)
+        resized_w = max(32, int(round(w * ratio / 32)) * 32)
+        resized = cv2.resize(img, (resized_w, resized_h))
+        x = ((resized.astype(np.float32) / 255.0 - DET_MEAN) / DET_STD).transpose(2, 0, 1)[None]
+
+        prob = self.det.run(None, {self.det_input: x})[0][0, 0]
+        mask = (prob > DET_THRESH).astype(np.uint8)
+        contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        scale = np.array([w / resized_w, h / resized_h], dtype=np.float32)
+        boxes = []
+        for contour in contours[:DET_MAX_BOXES]:
+            (cx, cy), (bw, bh), angle = cv2.minAreaRect(contour)
+            if min(bw, bh) < DET_MIN_SIZE:
+                continue
+
+            x0, y0, rw, rh = cv2.boundingRect(contour)
+            region = np.zeros((rh, rw), dtype=np.uint8)
+            cv2.fillPoly(region, [contour - (x0, y0)], 1)
+            if cv2.mean(prob[y0:y0 + rh, x0:x0 + rw], region)[0] < DET_BOX_THRESH:
+                continue
+
+            # DB shrinks text regions during training; grow them back (area * ratio / perimeter)
+            distance = bw * bh * DET_UNCLIP_RATIO / (2 * (bw + bh))
+            box = cv2.boxPoints(((cx, cy), (bw + 2 * distance, bh + 2 * distance), angle)) * scale
+            boxes.append(_order_points(box))
+
+        return _sort_reading_order(boxes)
+
+    def _recognize(self, crops):
+        texts = [""] * len(crops)
+        # Similar aspect ratios per batch keep padding small
+        order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1] / crops[i].shape[0])
+
+        for start in range(0, len(order), REC_BATCH):
+            chunk = order[start:start + REC_BATCH]
+            widths = [min(REC_MAX_WIDTH, int(math.ceil(REC_HEIGHT * crops[i].shape[1] / crops[i].shape[0]))) for i in chunk]
+            batch = np.zeros((len(chunk), 3, REC_HEIGHT, max(widths)), dtype=np.float32)
+            for row, (i, width) in enumerate(zip(chunk, widths)):
+                resized = cv2.resize(crops[i], (width, REC_HEIGHT)).astype(np.float32)
+                batch[row, :, :, :width] = ((resized / 255.0 - 0.5) / 0.5).transpose(2, 0, 1)
+
+            probs = self.rec.run(None, {self.rec_input: batch})[0]
+            for i, seq in zip(chunk, probs):
+                texts[i] = self._ctc_decode(seq)
+        return texts
+
+    def _ctc_decode(self, probs):
+        idx = probs.argmax(axis=1)
+        keep = np.insert(idx[1:] != idx[:-1], 0, True) & (idx != 0)
+        return "".join(self.charset[i] for i in idx[keep] if i < len(self.charset))
+
+    def read_batch(self, images):
+        """
+        OCR a list of BGR or grayscale pages; returns one string per page.
+        Line crops from every page are recognized together.
+        """
+        crops, owners = [], []
+        for page, img in enumerate(images):
+            if img.ndim == 2:
+                img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+            for box in self._detect(img):
+                crop = _crop_box(img, box)
+                if crop is not None:
+                    crops.append(crop)
+                    owners.append(page)
+
+        lines = [[] for _ in images]
+        for page, text in zip(owners, self._recognize(crops) if crops else []):
+            if text:
+                lines[page].append(text)
+        return [" ".join(page_lines) for page_lines in lines]
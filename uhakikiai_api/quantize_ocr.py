@@ -0,0 +1,99 @@
+"""
+Post-training int8 quantization for the PP-OCR recognition model.
+
+Writes an int8 copy of the rec model (dynamic quantization: int8 weights, activations
+quantized per batch at runtime, so no calibration pass is needed to build it) and,
+given a calibration set, reports the CER/WER change before you swap it in.
+
+    python quantize_ocr.py models/ppocrv5_mobile_rec.onnx models/ppocrv5_mobile_rec_int8.onnx \\
+        --calibration-dir calib/ --max-cer-increase 0.01
+
+Calibration set: page images (.jpg/.png) next to a .txt file with the same name holding
+the expected text. Deploy by pointing OCR_ONNX_REC_MODEL at the int8 file.
+"""
+import os
+import sys
+import argparse
+
+import cv2
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+from ppocr_onnx import PPOCREngine
+from ocr_worker import OCR_ONNX_DET_MODEL, OCR_ONNX_DICT
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def quantize_rec_model(src_path, dst_path):
+    # Only the MatMul/Gemm-heavy encoder gains from int8; ConvInteger kernels are slower than fp32 Conv on CPU
+    quantize_dynamic(src_path, dst_path, op_types_to_quantize=["MatMul", "Gemm"], weight_type=QuantType.QInt8)
+    print(f"Wrote {dst_path} ({os.path.getsize(src_path) / 1e6:.1f} MB -> {os.path.getsize(dst_path) / 1e6:.1f} MB)")
+
+
+def edit_distance(a, b):
+    prev = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        curr = [i]
+        for j, y in enumerate(b, 1):
+            curr.append(min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + (x != y)))
+        prev = curr
+    return prev[-1]
+
+
+def load_calibration_set(calibration_dir):
+    samples = []
+    for name in sorted(os.listdir(calibration_dir)):
+        stem, ext = os.path.splitext(name)
+        label_path = os.path.join(calibration_dir, stem + ".txt")
+        if ext.lower() not in IMAGE_EXTENSIONS or not os.path.exists(label_path):
+            continue
+        img = cv2.imread(os.path.join(calibration_dir, name), cv2.IMREAD_GRAYSCALE)
+        with open(label_path, encoding="utf-8") as f:
+            samples.append((img, f.read()))
+    return samples
+
+
+def error_rates(engine, samples):
+    """
+    Corpus-level (CER, WER), compared the way the pipeline reads text: uppercased, whitespace-normalized.
+    """
+    char_errors = char_total = word_errors = word_total = 0
+    for img, expected in samples:
+        predicted = engine.read_batch([img])[0].upper().split()
+        expected = expected.upper().split()
+        char_errors += edit_distance(" ".join(predicted), " ".join(expected))
+        char_total += len(" ".join(expected))
+        word_errors += edit_distance(predicted, expected)
+        word_total += len(expected)
+    return char_errors / max(char_total, 1), word_errors / max(word_total, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("rec_model", help="fp32 recognition model (.onnx)")
+    parser.add_argument("output", help="where to write the int8 model")
+    parser.add_argument("--calibration-dir", help="images + .txt ground truth to compare fp32 vs int8 on")
+    parser.add_argument("--det-model", default=OCR_ONNX_DET_MODEL)
+    parser.add_argument("--dict", default=OCR_ONNX_DICT)
+    parser.add_argument("--max-cer-increase", type=float, default=0.01, help="fail if CER rises by more than this")
+    args = parser.parse_args()
+
+    quantize_rec_model(args.rec_model, args.output)
+    if not args.calibration_dir:
+        return
+
+    samples = load_calibration_set(args.calibration_dir)
+    if not samples:
+        sys.exit(f"No labelled images found in {args.calibration_dir}")
+
+    fp32_cer, fp32_wer = error_rates(PPOCREngine(args.det_model, args.rec_model, args.dict), samples)
+    int8_cer, int8_wer = error_rates(PPOCREngine(args.det_model, args.output, args.dict), samples)
+    print(f"{len(samples)} samples | fp32 CER {fp32_cer:.2%} WER {fp32_wer:.2%} | int8 CER {int8_cer:.2%} WER {int8_wer:.2%}")
+
+    if int8_cer - fp32_cer > args.max_cer_increase:
+        sys.exit(f"CER regression {int8_cer - fp32_cer:.2%} exceeds {args.max_cer_increase:.2%}; keep the fp32 model")
+    print("Accuracy within budget; set OCR_ONNX_REC_MODEL to the int8 model to deploy it.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,51 @@
 import os
+import hmac
 import secrets
 import uvicorn
 import cv2
 import numpy as np
-import pytesseract  # UPDATED from easyocr
+try:
+    import hyperscan  # DFA regex engine; falls back to `re` when unavailable
+except ImportError:
+    hyperscan = None
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY  # libjpeg-turbo SIMD decoder
+except ImportError:
+    TurboJPEG = None
 import re
 import time
-from datetime import datetime
+import functools
+import asyncio
+import httpx
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
 from typing import Optional, List
 from collections import defaultdict
 
 # FastAPI & Pydantic
 from fastapi import FastAPI, HTTPException, Header, Depends, File, UploadFile, Form, status, Request
 from fastapi.security import APIKeyHeader
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 # Security & Crypto
 from passlib.context import CryptContext
+from blake3 import blake3
+from cachetools import TTLCache
 
 # Database
-from supabase import create_client, Client
+import asyncpg
+from supabase import create_client, Client, ClientOptions
 
 # Image Processing
 from PIL import Image, ImageChops
 from io import BytesIO
 
+# OCR (runs in dedicated worker processes)
+from ocr_worker import OCRWorkerPool
+
 # Environment Variables
 from dotenv import load_dotenv
 from fastapi.openapi.docs import get_swagger_ui_html
@@ -41,6 +62,15 @@ load_dotenv()
 # Check for credentials
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+# Optional direct Postgres DSN. Use the Supavisor pooler in transaction mode (port 6543).
+SUPABASE_DB_URL = os.environ.get("SUPABASE_DB_URL")
+
+# CONNECTION POOL: One shared keep-alive pool for every Supabase query.
+# Kept under Supabase's connection cap so bursts queue instead of failing.
+db_http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30),
+    timeout=httpx.Timeout(30.0),
+)
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     print("WARNING: SUPABASE_URL or SUPABASE_KEY not found in env. Database calls will fail.")
@@ -48,13 +78,179 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     supabase: Client = None 
 else:
     try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase: Client = create_client(
+            SUPABASE_URL,
+            SUPABASE_KEY,
+            options=ClientOptions(httpx_client=db_http_client),
+        )
     except Exception as e:
         print(f"Failed to initialize Supabase: {e}")
         supabase = None
 
+# Errors raised before the request was sent (no connection / no free pool slot): safe to retry anything.
+RETRYABLE_WRITE_ERRORS = (httpx.ConnectError, httpx.PoolTimeout)
+# A dropped keep-alive connection (RemoteProtocolError) may have hit the server after it ran the
+# statement, so it is only retried for reads; retrying an insert could duplicate the row(s).
+RETRYABLE_READ_ERRORS = RETRYABLE_WRITE_ERRORS + (httpx.RemoteProtocolError,)
+
+def retry_on_disconnect(errors, retries: int = 2):
+    """
+    Pre-ping equivalent: retry a query when its pooled connection turns out to be dead.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except errors as e:
+                    if attempt == retries:
+                        raise
+                    print(f"DB connection dropped ({e.__class__.__name__}), retrying...")
+        return wrapper
+    return decorator
+
+@retry_on_disconnect(RETRYABLE_READ_ERRORS)
+def db_execute(query):
+    return query.execute()
+
+@retry_on_disconnect(RETRYABLE_WRITE_ERRORS)
+def db_write(query):
+    return query.execute()
+
+# ASYNC DB ACCESS: asyncpg pool when SUPABASE_DB_URL is set (created on startup),
+# otherwise the Supabase client runs in the threadpool so the event loop never blocks.
+# Hot-path lookups fetch only the columns they read; see sql/lookup_indexes.sql for the indexes behind them.
+db_pool: Optional[asyncpg.Pool] = None
+
+def database_ready() -> bool:
+    return db_pool is not None or supabase is not None
+
+async def fetch_company_id(email: str) -> Optional[str]:
+    if db_pool:
+        company_id = await db_pool.fetchval("SELECT id FROM companies WHERE email = $1", email)
+        return str(company_id) if company_id is not None else None
+    res = await run_in_threadpool(db_execute, supabase.table("companies").select("id").eq("email", email))
+    return res.data[0]['id'] if res.data else None
+
+async def insert_api_key(company_id: str, key_hash: str, prefix: str):
+    created_at = datetime.now(timezone.utc)
+    if db_pool:
+        await db_pool.execute(
+            "INSERT INTO api_keys (company_id, key_hash, prefix, is_active, created_at) VALUES ($1, $2, $3, $4, $5)",
+            company_id, key_hash, prefix, True, created_at,
+        )
+        return
+    await run_in_threadpool(db_write, supabase.table("api_keys").insert({
+        "company_id": company_id,
+        "key_hash": key_hash,
+        "prefix": prefix,
+        "is_active": True,
+        "created_at": created_at.isoformat()
+    }))
+
+async def fetch_active_api_key(prefix: str) -> Optional[dict]:
+    if db_pool:
+        row = await db_pool.fetchrow("SELECT company_id, key_hash FROM api_keys WHERE prefix = $1 AND is_active LIMIT 1", prefix)
+        if row is None:
+            return None
+        record = dict(row)
+        record['company_id'] = str(record['company_id'])
+        return record
+    res = await run_in_threadpool(
+        db_execute, supabase.table("api_keys").select("company_id,key_hash").eq("prefix", prefix).eq("is_active", True).limit(1)
+    )
+    return res.data[0] if res.data else None
+
+async def fetch_national_record(index_number: str) -> Optional[dict]:
+    if db_pool:
+        row = await db_pool.fetchrow("SELECT full_name, school_name, mean_grade FROM national_records WHERE index_number = $1 LIMIT 1", index_number)
+        return dict(row) if row is not None else None
+    res = await run_in_threadpool(
+        db_execute, supabase.table("national_records").select("full_name,school_name,mean_grade").eq("index_number", index_number).limit(1)
+    )
+    return res.data[0] if res.data else None
+
+async def insert_usage_logs(rows: list):
+    if db_pool:
+        await db_pool.executemany(
+            'INSERT INTO usage_logs (company_id, request_endpoint, response_status, fraud_verdict, risk_score, "timestamp") '
+            'VALUES ($1, $2, $3, $4, $5, $6)',
+            [(row["company_id"], row["request_endpoint"], row["response_status"],
+              row["fraud_verdict"], row["risk_score"], row["timestamp"]) for row in rows],
+        )
+        return
+    await run_in_threadpool(db_write, supabase.table("usage_logs").insert(
+        [{**row, "timestamp": row["timestamp"].isoformat()} for row in rows]
+    ))
+
+class UsageLogWriter:
+    """
+    Buffers usage_logs rows and writes them in bulk, off the response path.
+    A batch is flushed `interval` seconds after its first row or once `max_rows` are queued.
+    The buffer is bounded: when the DB falls behind, the oldest rows are dropped.
+    """
+    def __init__(self, max_rows=500, interval=1.0, max_queue=10_000):
+        self.max_rows = max_rows
+        self.interval = interval
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # Set by put() once a full batch is waiting, so run() doesn't sit out the interval
+        self.batch_full = asyncio.Event()
+        self.writing = None
+        self.task = None
+
+    def put(self, row: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            print("Usage log buffer full, dropping oldest row.")
+        self.queue.put_nowait(row)
+        # run() already holds the batch's first row
+        if self.queue.qsize() + 1 >= self.max_rows:
+            self.batch_full.set()
+
+    def _drain(self, rows):
+        while len(rows) < self.max_rows and not self.queue.empty():
+            rows.append(self.queue.get_nowait())
+        return rows
+
+    async def _write(self, rows):
+        try:
+            await insert_usage_logs(rows)
+        except Exception as e:
+            print(f"Logging failed ({len(rows)} rows): {e}")
+
+    async def run(self):
+        while True:
+            rows = [await self.queue.get()]
+            self.batch_full.clear()
+            try:
+                if self.queue.qsize() + 1 < self.max_rows:
+                    try:
+                        await asyncio.wait_for(self.batch_full.wait(), self.interval)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.writing = asyncio.create_task(self._write(self._drain(rows)))
+            # One write at a time: while the DB is slow the backlog stays in the bounded queue
+            # (where drop-oldest applies) instead of piling up threadpool/connection-holding inserts.
+            # Shielded so shutdown's cancel doesn't abort a batch mid-insert.
+            await asyncio.shield(self.writing)
+
+    async def close(self):
+        # Shutdown: stop the timer, then write the in-flight batch and everything still buffered
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        if self.writing:
+            await self.writing
+        while not self.queue.empty():
+            await self._write(self._drain([]))
+
+# Created on startup
+usage_log_writer: Optional[UsageLogWriter] = None
+
 # --- 2. AUTHENTICATION & SECURITY LOGIC (HARDENED) ---
 
+# Legacy only: keys issued before the BLAKE3 switch are still bcrypt hashes
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
@@ -87,20 +283,39 @@ def check_rate_limit(client_ip: str):
 def record_failure(client_ip: str):
     failed_attempts[client_ip]["count"] += 1
 
-def generate_api_key_logic(company_email: str):
+# AUTH CACHE: { key_hash: company_id } for recently validated keys.
+# Short TTL so deactivated keys stop working within a minute.
+API_KEY_CACHE_TTL = int(os.environ.get("API_KEY_CACHE_TTL", 60))
+validated_keys = TTLCache(maxsize=4096, ttl=API_KEY_CACHE_TTL)
+
+# BLAKE3 keyed mode needs exactly 32 bytes; derive them from the pepper
+API_KEY_HASH_KEY = blake3(SECRET_PEPPER.encode(), derive_key_context="UhakikiAI api_keys.key_hash v1").digest()
+
+def hash_api_key(raw_key: str) -> str:
+    """
+    Fast peppered digest of an API key (keyed BLAKE3, i.e. a MAC under the pepper).
+    Keys carry 256 bits of entropy, so a slow KDF (bcrypt) adds ~100ms per request without adding security.
+    """
+    return blake3(raw_key.encode(), key=API_KEY_HASH_KEY).hexdigest()
+
+def verify_api_key_hash(raw_key: str, candidate_hash: str, stored_hash: str) -> bool:
+    if stored_hash.startswith("$2"):
+        # Legacy bcrypt hash
+        return pwd_context.verify(f"{raw_key}{SECRET_PEPPER}", stored_hash)
+    return hmac.compare_digest(candidate_hash, stored_hash)
+
+async def generate_api_key_logic(company_email: str):
     """
     Generates a PEPPERED secure API key.
     Called by the Admin Portal.
     """
-    if not supabase:
+    if not database_ready():
         raise HTTPException(status_code=500, detail="Database not configured")
 
     # 1. Find Company ID
-    res = supabase.table("companies").select("id").eq("email", company_email).execute()
-    if not res.data:
+    company_id = await fetch_company_id(company_email)
+    if company_id is None:
         raise HTTPException(status_code=404, detail="Company not registered")
-    
-    company_id = res.data[0]['id']
 
     # 2. Generate Key (e.g., uh_live_AbCd123...)
     # Using 32 bytes of entropy
@@ -110,18 +325,11 @@ def generate_api_key_logic(company_email: str):
     # Store prefix to look up quickly, mask the rest
     prefix = raw_key[:12] 
     
-    # COMBINE KEY + PEPPER before hashing
-    peppered_key = f"{raw_key}{SECRET_PEPPER}"
-    key_hash = pwd_context.hash(peppered_key)
+    # Keyed BLAKE3 under the pepper-derived key
+    key_hash = hash_api_key(raw_key)
 
     # 4. Save Hash to DB
-    supabase.table("api_keys").insert({
-        "company_id": company_id,
-        "key_hash": key_hash,
-        "prefix": prefix,
-        "is_active": True,
-        "created_at": datetime.utcnow().isoformat()
-    }).execute()
+    await insert_api_key(company_id, key_hash, prefix)
 
     return {"api_key": raw_key, "message": "CRITICAL: Copy this key. It is never stored in plain text."}
 
@@ -136,8 +344,15 @@ async def validate_api_key(request: Request, x_api_key: str = Depends(api_key_he
     if not x_api_key:
         record_failure(client_ip)
         raise HTTPException(status_code=403, detail="X-API-Key header missing")
-    
-    if not supabase:
+
+    candidate_hash = hash_api_key(x_api_key)
+
+    # 2. Recently validated? Skip the DB roundtrip
+    company_id = validated_keys.get(candidate_hash)
+    if company_id is not None:
+        return company_id
+
+    if not database_ready():
         # Fallback for local testing if DB is down
         if x_api_key.startswith("uh_test_"):
              return "test_company_id"
@@ -145,37 +360,66 @@ async def validate_api_key(request: Request, x_api_key: str = Depends(api_key_he
 
     prefix = x_api_key[:12]
     
-    # 2. Look up by prefix (Fast)
-    res = supabase.table("api_keys").select("*").eq("prefix", prefix).eq("is_active", True).execute()
+    # 3. Look up by prefix (Fast)
+    record = await fetch_active_api_key(prefix)
     
-    if not res.data:
+    if record is None:
         record_failure(client_ip)
         raise HTTPException(status_code=401, detail="Invalid API Key (Prefix mismatch)")
     
-    record = res.data[0]
-    
-    # 3. Verify Hash (Key + Pepper)
-    peppered_input = f"{x_api_key}{SECRET_PEPPER}"
-
-    if not pwd_context.verify(peppered_input, record['key_hash']):
+    # 4. Verify Hash (Key + Pepper), constant-time
+    if not verify_api_key_hash(x_api_key, candidate_hash, record['key_hash']):
         record_failure(client_ip)
         print(f"SECURITY ALERT: Failed key attempt for prefix {prefix} from {client_ip}")
         raise HTTPException(status_code=401, detail="Invalid API Key (Hash mismatch)")
-    
+
+    validated_keys[candidate_hash] = record['company_id']
     return record['company_id']
 
 # --- 3. CORE ENGINE & INTELLIGENCE ---
 
-# UPDATED: Initialize Tesseract Check (Lighter than EasyOCR)
-try:
-    print("Loading OCR Engine (Tesseract)...")
-    # Verify tesseract is installed
-    pytesseract.get_tesseract_version()
-    print("OCR Model Loaded.")
-except Exception as e:
-    print(f"Warning: OCR Engine failed to load. {e}")
+# OCR BACKEND: "tesseract" (default), "easyocr" or "onnx" (PP-OCRv5 on ONNX Runtime).
+# The model is loaded once per OCR worker process (see ocr_worker.py); the batched
+# backends also coalesce concurrent pages into one call, see OCRBatcher.
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "tesseract").lower()
+# Each worker holds its own model copy. Batched backends default to one shared model (OCRBatcher already
+# coalesces requests and the worker gets every core); Tesseract is light and single-page, so it runs 4 workers.
+OCR_WORKERS = min(os.cpu_count(), int(os.environ.get("OCR_CONCURRENCY", 4 if OCR_BACKEND == "tesseract" else 1)))
+OCR_TIMEOUT = float(os.environ.get("OCR_TIMEOUT", 60))
+# Model download + load per worker; startup fails instead of hanging if a worker never comes up
+OCR_STARTUP_TIMEOUT = float(os.environ.get("OCR_STARTUP_TIMEOUT", 300))
+
+# PROCESS POOL: decode/forensics are CPU-bound; created on startup.
+process_pool: Optional[ProcessPoolExecutor] = None
+
+def init_pipeline_worker():
+    # One OpenCV thread per process; the pool itself provides the parallelism
+    cv2.setNumThreads(1)
+
+def create_process_pool() -> ProcessPoolExecutor:
+    # spawn: workers start on demand, from a process that already runs threads (executor manager,
+    # threadpool, OCR dispatcher), so forking them would be unsafe
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(), initializer=init_pipeline_worker, mp_context=mp.get_context("spawn")
+    )
 
-def run_forensics(img_cv):
+async def run_in_process_pool(func, *args):
+    """
+    Runs func in the decode/forensics pool. One worker dying (OOM on a huge/crafted image, decoder crash)
+    breaks the whole executor, so it is replaced and only this request fails.
+    """
+    global process_pool
+    pool = process_pool
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        if process_pool is pool:
+            print("Warning: pipeline worker died, restarting the process pool.")
+            process_pool = create_process_pool()
+            pool.shutdown(wait=False)
+        raise HTTPException(status_code=503, detail="Image processing failed. Please retry.")
+
+def run_forensics(img_gray):
     """
     Advanced Step 1: Detect Digital Manipulation (Generative AI Artifacts)
     Corresponds to 'Generative Document Forgery Detection'.
@@ -185,8 +429,9 @@ def run_forensics(img_cv):
 
     # A. Noise Analysis (ELA - Error Level Analysis Simulation)
     # Synthetic images often lack the natural high-frequency noise of scanned paper.
-    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-    noise_sigma = np.std(gray)
+    # OpenCV's SIMD reduction; same value as np.std(gray) at a fraction of the cost
+    _, stddev = cv2.meanStdDev(img_gray)
+    noise_sigma = float(stddev[0, 0])
     
     # Thresholds tuned for MVP
     if noise_sigma < 5.0: 
@@ -197,26 +442,119 @@ def run_forensics(img_cv):
         score_penalty += 15
 
     # B. Document Structure Check (Size/Ratio)
-    height, width, _ = img_cv.shape
+    height, width = img_gray.shape[:2]
     aspect_ratio = width / height
     
     return flags, score_penalty
 
-def run_ocr_extraction(img_cv):
+class OCRBatcher:
     """
-    Step 2: Extract Text Data (UPDATED to Tesseract)
+    Feeds pages to the OCR worker pool, coalescing concurrent pages into one job.
+    A batch is flushed after `window` seconds or once `max_batch` pages are queued;
+    several batches can be in flight at once (one per OCR worker).
     """
-    # Preprocessing to help Tesseract
-    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-    
+    def __init__(self, ocr_pool, max_batch=16, window=0.02):
+        self.ocr_pool = ocr_pool
+        self.max_batch = max_batch
+        self.window = window
+        self.queue = asyncio.Queue()
+        self.inflight = set()
+        self.task = None
+
+    async def submit(self, img) -> Optional[str]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((img, future))
+        return await future
+
+    async def _dispatch(self, batch):
+        try:
+            texts = await asyncio.wait_for(
+                asyncio.wrap_future(self.ocr_pool.submit([img for img, _ in batch])), OCR_TIMEOUT
+            )
+        except Exception as e:
+            print(f"OCR Error: {e}")
+            # None (not "") so callers can tell a failed read from a blank page
+            texts = [None] * len(batch)
+
+        for (_, future), text in zip(batch, texts):
+            if not future.done():
+                future.set_result(text)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+
+# Created on startup
+ocr_pool: Optional[OCRWorkerPool] = None
+ocr_batcher: Optional[OCRBatcher] = None
+
+# Keywords expected in Kenyan Academic Documents
+REQUIRED_KEYWORDS = ["KENYA", "CERTIFICATE", "EXAMINATION"]
+# Standard Kenyan ID/Index patterns
+INDEX_NUMBER_PATTERN = r'\d{8,12}'
+
+def build_text_scanner():
+    """
+    Compiles the index-number pattern and every required keyword into one Hyperscan
+    database, so the OCR text is scanned in a single pass.
+    """
+    expressions = [INDEX_NUMBER_PATTERN.encode()] + [re.escape(kw).encode() for kw in REQUIRED_KEYWORDS]
+    flags = [hyperscan.HS_FLAG_SOM_LEFTMOST] + [hyperscan.HS_FLAG_SINGLEMATCH] * len(REQUIRED_KEYWORDS)
+    db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    db.compile(expressions=expressions, ids=list(range(len(expressions))), elements=len(expressions), flags=flags)
+    return db
+
+# Compiled once per process. Scans run on the event loop only (the database owns a single scratch space).
+text_scanner = None
+if hyperscan:
     try:
-        # Extract text
-        full_text = pytesseract.image_to_string(thresh).upper()
-        return full_text, []
+        text_scanner = build_text_scanner()
     except Exception as e:
-        print(f"OCR Error: {e}")
-        return "", []
+        print(f"Warning: Hyperscan failed to compile, using re. {e}")
+
+def scan_document_text(extracted_text):
+    """
+    Returns (index_number, found_keywords).
+    index_number is the same match re.search(INDEX_NUMBER_PATTERN) gives: leftmost start, longest run.
+    """
+    if text_scanner is None:
+        index_match = re.search(INDEX_NUMBER_PATTERN, extracted_text)
+        found_keywords = [kw for kw in REQUIRED_KEYWORDS if kw in extracted_text]
+        return (index_match.group(0) if index_match else None), found_keywords
+
+    data = extracted_text.encode()
+    index_span = []
+    keyword_ids = set()
+
+    def on_match(pattern_id, start, end, flags, context):
+        if pattern_id == 0:
+            # Matches arrive by end offset; extend the first run, ignore later ones
+            if not index_span:
+                index_span.extend([start, end])
+            elif start == index_span[0]:
+                index_span[1] = end
+        else:
+            keyword_ids.add(pattern_id)
+
+    text_scanner.scan(data, match_event_handler=on_match)
+
+    index_number = data[index_span[0]:index_span[1]].decode() if index_span else None
+    found_keywords = [kw for i, kw in enumerate(REQUIRED_KEYWORDS, start=1) if i in keyword_ids]
+    return index_number, found_keywords
 
 def agentic_verification_logic(extracted_text, forensics_flags, forensics_penalty):
     """
@@ -235,31 +573,115 @@ def agentic_verification_logic(extracted_text, forensics_flags, forensics_penalt
         verdict["reasoning"].extend(forensics_flags)
 
     # Agent Input: Contextual Logic (NLP-lite)
-    # Check for keywords expected in Kenyan Academic Documents
-    required_keywords = ["KENYA", "CERTIFICATE", "EXAMINATION"]
+    # One pass finds both the keywords and the Index Number
+    index_number, found_keywords = scan_document_text(extracted_text)
+
     # Check how many are missing
-    found_keywords = [kw for kw in required_keywords if kw in extracted_text]
-    
     if len(found_keywords) < 2:
         verdict["risk_score"] += 25
         verdict["reasoning"].append(f"Document lacks standard terminology. Found: {found_keywords}")
 
-    # Regex Extraction for Index Number (The Key Identifier)
-    # Updated regex to handle standard Kenyan ID/Index patterns
-    index_match = re.search(r'\d{8,12}', extracted_text)
-    index_number = None
-
-    if index_match:
-        index_number = index_match.group(0)
-    else:
+    # Index Number (The Key Identifier)
+    if not index_number:
         verdict["risk_score"] += 50 # Critical failure
         verdict["reasoning"].append("Could not identify a valid Index Number.")
 
     return verdict, index_number
 
-def run_verification_pipeline(image_bytes):
+# JPEG DECODER: PyTurboJPEG when libturbojpeg is installed, otherwise cv2.imdecode
+jpeg_decoder = None
+if TurboJPEG is not None:
+    try:
+        jpeg_decoder = TurboJPEG()
+    except Exception as e:
+        print(f"Warning: libturbojpeg not found, using cv2.imdecode. {e}")
+
+EXIF_ORIENTATION = 0x0112
+
+def decode_grayscale(image_bytes):
+    """
+    Decodes uploads straight to a single luma plane; forensics and OCR never use chroma.
+    JPEGs go through TurboJPEG; PNGs (and anything else) through OpenCV.
+    Rotated phone photos stay on OpenCV, which applies the EXIF orientation (TurboJPEG doesn't).
+    """
+    if jpeg_decoder is not None and image_bytes[:2] == b"\xff\xd8":
+        try:
+            orientation = Image.open(BytesIO(image_bytes)).getexif().get(EXIF_ORIENTATION, 1)
+            if orientation == 1:
+                return jpeg_decoder.decode(image_bytes, pixel_format=TJPF_GRAY)[:, :, 0]
+        except Exception:
+            # Malformed EXIF, CMYK->GRAY, etc.: OpenCV's decoder copes with these
+            pass
+
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+
+# ID/certificate text stays legible at ~1500px on the long side; 12MP phone photos only cost OCR time
+MAX_OCR_SIDE = 1600
+
+def limit_resolution(img, max_side=MAX_OCR_SIDE):
+    height, width = img.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return img
+
+def is_decodable(image_bytes) -> bool:
+    """
+    Upload validation only (no forensics/OCR). Runs in the process pool.
+    """
+    try:
+        return decode_grayscale(image_bytes) is not None
+    except Exception:
+        return False
+
+def run_document_analysis(image_bytes):
+    """
+    CPU-bound half of the pipeline (decode, forensics). Runs in the process pool.
+    Returns (f_flags, f_penalty, img_gray) for the OCR workers, or None if the image can't be decoded.
+    """
+    # 1. Image Preprocessing
+    try:
+        img_gray = decode_grayscale(image_bytes)
+        if img_gray is None:
+            raise ValueError("Invalid image data")
+    except Exception:
+        return None
+
+    # 2. Forensics Analysis (The 'AI Defense' layer)
+    f_flags, f_penalty = run_forensics(img_gray)
+
+    # Downscale for OCR only: INTER_AREA averages away the pixel noise the forensics thresholds were tuned on
+    return f_flags, f_penalty, limit_resolution(img_gray)
+
+# ANALYSIS CACHE: { blake3(file bytes): (f_flags, f_penalty, full_text) } so client retries / re-uploads skip
+# decode + forensics + OCR. Only this part is a pure function of the upload; the registry lookup and final
+# decision run on every request. Failed OCR reads are never cached. Per-process on purpose (no shared-memory locking).
+analysis_cache = TTLCache(maxsize=10_000, ttl=3600)
+
+async def extract_document(image_bytes):
+    """
+    Decode + forensics in the process pool, then OCR in the OCR workers.
+    Returns (f_flags, f_penalty, full_text), or None if the image can't be decoded. full_text is None if OCR failed.
+    """
+    content_hash = blake3(image_bytes).hexdigest()
+    cached = analysis_cache.get(content_hash)
+    if cached is not None:
+        return cached
+
+    analysis = await run_in_process_pool(run_document_analysis, image_bytes)
+    if analysis is None:
+        return None
+
+    f_flags, f_penalty, img_gray = analysis
+    full_text = await ocr_batcher.submit(img_gray)
+    if full_text is not None:
+        analysis_cache[content_hash] = (f_flags, f_penalty, full_text)
+    return f_flags, f_penalty, full_text
+
+async def run_verification_pipeline(image_bytes):
     """
     Orchestrates the full UhakikiAI pipeline.
+    Forensics run in the process pool and OCR in the OCR workers, so the event loop keeps serving other requests.
     """
     response_payload = {
         "final_decision": "UNCERTAIN",
@@ -268,20 +690,15 @@ def run_verification_pipeline(image_bytes):
         "extracted_data": {}
     }
 
-    # 1. Image Preprocessing
-    try:
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img_cv = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img_cv is None:
-            raise ValueError("Invalid image data")
-    except Exception:
+    document = await extract_document(image_bytes)
+    if document is None:
         return {"final_decision": "ERROR", "details": ["File is not a valid image"], "risk_score": 0}
 
-    # 2. Forensics Analysis (The 'AI Defense' layer)
-    f_flags, f_penalty = run_forensics(img_cv)
-
     # 3. OCR Extraction
-    full_text, raw_words = run_ocr_extraction(img_cv)
+    f_flags, f_penalty, full_text = document
+    if full_text is None:
+        # Timeout / crashed worker / backend error: an empty read would score as a forgery (and be billed)
+        raise HTTPException(status_code=503, detail="OCR engine unavailable. Please retry.")
 
     # 4. Agent Logic (Initial Risk Assessment)
     agent_verdict, index_number = agentic_verification_logic(full_text, f_flags, f_penalty)
@@ -292,17 +709,15 @@ def run_verification_pipeline(image_bytes):
     # 5. National DB Cross-Reference (The 'Source of Truth')
     # Only proceed if we found an index number and risk isn't already 100
     if index_number and response_payload["risk_score"] < 80:
-        if supabase:
+        if database_ready():
             # Query "Golden Record" from National DB Table
-            db_res = supabase.table("national_records").select("*").eq("index_number", index_number).execute()
+            record = await fetch_national_record(index_number)
             
-            if not db_res.data:
+            if record is None:
                 response_payload["risk_score"] = 100
                 response_payload["details"].append(f"Identity {index_number} NOT FOUND in National Registry.")
                 response_payload["final_decision"] = "FRAUD"
             else:
-                record = db_res.data[0]
-                
                 # Check 1: Name Match (Fuzzy logic is better, strictly exact here for MVP)
                 db_name = record.get('full_name', '').upper().strip()
                 if db_name not in full_text:
@@ -349,7 +764,7 @@ Built for developers who require high-fidelity forensic analysis and secondary v
 
 ### ⚡ Technical Specs:
 - **Engine Version:** `1.0.0-production`
-- **Security:** Peppered Hash (Argon2/Bcrypt) + Rate Limiting
+- **Security:** Peppered Hash (BLAKE3) + Rate Limiting
 - **Latency:** Optimized for < 2.5s verification cycles.
 """
 
@@ -393,6 +808,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_event():
+    global db_pool, process_pool, ocr_pool, ocr_batcher, usage_log_writer
+    loop = asyncio.get_running_loop()
+    process_pool = create_process_pool()
+    # Start one worker now so the first request doesn't pay the spawn + import
+    await loop.run_in_executor(process_pool, int)
+
+    ocr_pool = OCRWorkerPool(OCR_BACKEND, OCR_WORKERS)
+    try:
+        loaded_backend = await asyncio.wait_for(asyncio.wrap_future(ocr_pool.ready), OCR_STARTUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        await run_in_threadpool(ocr_pool.close)
+        raise RuntimeError(f"OCR workers not ready after {OCR_STARTUP_TIMEOUT:.0f}s")
+    # Tesseract gains nothing from batching; send pages one by one so they spread across workers
+    ocr_batcher = OCRBatcher(ocr_pool, max_batch=1 if loaded_backend == "tesseract" else 16)
+    ocr_batcher.task = asyncio.create_task(ocr_batcher.run())
+
+    if SUPABASE_DB_URL:
+        try:
+            # statement_cache_size=0: prepared statements don't survive Supavisor transaction mode
+            db_pool = await asyncpg.create_pool(
+                SUPABASE_DB_URL, min_size=2, max_size=10, statement_cache_size=0
+            )
+        except Exception as e:
+            print(f"Failed to initialize Postgres pool: {e}")
+
+    usage_log_writer = UsageLogWriter()
+    usage_log_writer.task = asyncio.create_task(usage_log_writer.run())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if usage_log_writer:
+        await usage_log_writer.close()
+    if db_pool:
+        await db_pool.close()
+    if process_pool:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+    if ocr_batcher:
+        ocr_batcher.task.cancel()
+    if ocr_pool:
+        await run_in_threadpool(ocr_pool.close)
+
 # Root Endpoint
 @app.get("/")
 def read_root():
@@ -409,20 +867,38 @@ def register_company(name: str = Form(...), email: str = Form(...)):
          raise HTTPException(status_code=500, detail="Database Unavailable")
     
     try:
-        res = supabase.table("companies").insert({"company_name": name, "email": email}).execute()
+        res = db_write(supabase.table("companies").insert({"company_name": name, "email": email}))
         return res.data
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/portal/generate_key", tags=["Admin"])
-def create_key(email: str = Form(...)):
+async def create_key(email: str = Form(...)):
     """
     Generate a **Secure Peppered API key**.
     """
-    return generate_api_key_logic(email)
+    return await generate_api_key_logic(email)
 
 # --- V1 PUBLIC API (For Client Integration) ---
 
+ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/jpg"]
+
+def check_image_type(file: UploadFile):
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG/PNG allowed.")
+
+def record_usage(company_id: str, endpoint: str, result: dict):
+    # Logging & Billing (buffered, written in bulk off the response path)
+    if database_ready():
+        usage_log_writer.put({
+            "company_id": company_id,
+            "request_endpoint": endpoint,
+            "response_status": 200,
+            "fraud_verdict": result["final_decision"],
+            "risk_score": result["risk_score"],
+            "timestamp": datetime.now(timezone.utc)
+        })
+
 @app.post("/v1/verify_document", tags=["Verification"])
 async def verify_document_endpoint(
     file: UploadFile = File(...),
@@ -432,27 +908,15 @@ async def verify_document_endpoint(
     **The Primary Endpoint.**
     """
     # 1. Validate File Type
-    if file.content_type not in ["image/jpeg", "image/png", "image/jpg"]:
-        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG/PNG allowed.")
+    check_image_type(file)
 
     content = await file.read()
     
-    # 2. Run the Engine
-    result = run_verification_pipeline(content)
+    # 2. Run the Engine (identical uploads reuse the cached forensics + OCR, see analysis_cache)
+    result = await run_verification_pipeline(content)
     
     # 3. Logging & Billing
-    if supabase:
-        try:
-            supabase.table("usage_logs").insert({
-                "company_id": company_id,
-                "request_endpoint": "/v1/verify_document",
-                "response_status": 200,
-                "fraud_verdict": result["final_decision"],
-                "risk_score": result["risk_score"],
-                "timestamp": datetime.utcnow().isoformat()
-            }).execute()
-        except Exception as e:
-            print(f"Logging failed: {e}")
+    record_usage(company_id, "/v1/verify_document", result)
     
     return result
 
@@ -465,6 +929,20 @@ async def biometric_match(
     """
     **Placeholder for Facial Recognition.**
     """
+    check_image_type(id_image)
+    check_image_type(selfie_image)
+
+    # Read and decode-check both uploads concurrently; the matcher will consume them once enabled
+    id_bytes, selfie_bytes = await asyncio.gather(id_image.read(), selfie_image.read())
+    id_ok, selfie_ok = await asyncio.gather(
+        run_in_process_pool(is_decodable, id_bytes),
+        run_in_process_pool(is_decodable, selfie_bytes),
+    )
+    if not id_ok:
+        raise HTTPException(status_code=400, detail="ID image is not a valid image")
+    if not selfie_ok:
+        raise HTTPException(status_code=400, detail="Selfie is not a valid image")
+
     return {
         "status": "NOT_IMPLEMENTED_YET", 
         "message": "Biometric matching module is enabled in v2.1",